@@ -5,7 +5,8 @@
 # ============== SETUP INSTRUCTIONS ==============
 # Before running this script, you need to:
 # 1. Install required packages by running these commands in your terminal:
-#    pip install pandas openai python-dotenv
+#    pip install pandas numpy scipy openai "httpx[http2]" python-dotenv tiktoken openpyxl xlsxwriter pyarrow
+#    (Optional) pip install faiss-cpu    <- makes the similar-feedback search faster on very large datasets
 #
 # 2. Create a .env file containing your OpenAI API key like this:
 #    OPENAI_API_KEY=your-key-here
@@ -16,33 +17,91 @@
 
 # Import required Python packages
 import os                   # For working with file paths
+import re                   # For spotting placeholder text like "N/A"
+import json                 # For writing and reading Batch API files
+import shelve               # For saving answers to disk so re-running the script doesn't ask ChatGPT again
+import hashlib              # For turning feedback text into a short, fixed-length key
+import time                 # For spacing out requests so we stay under OpenAI's rate limits
+import datetime             # For recognizing dates in the Excel file
+import asyncio              # For sending many requests to ChatGPT at the same time
+import tempfile             # For creating a temporary file to upload to the Batch API
+import numpy as np          # For fast math on lists of numbers (used to compare feedback texts)
 import pandas as pd         # For handling Excel files and data processing
-from openai import OpenAI   # For communicating with ChatGPT
+from scipy.sparse import csr_matrix                   # For storing which texts are similar to which (most pairs aren't)
+from scipy.sparse.csgraph import connected_components # For grouping similar texts together
+import tiktoken             # For splitting our labels into the "tokens" (word pieces) ChatGPT writes with
+import pyarrow as pa        # For converting our results into the Parquet format
+import pyarrow.parquet as pq  # For writing the results to a Parquet file a few rows at a time
+import xlsxwriter           # For writing the results to Excel a few rows at a time
+from openpyxl import load_workbook  # For reading the Excel file a few rows at a time
+import httpx                # For controlling the connections used to talk to OpenAI
+from openai import AsyncOpenAI  # For communicating with ChatGPT (the "Async" version lets us wait on many requests at once)
 from dotenv import load_dotenv  # For loading API key from .env file
 
+# faiss is optional. If it's installed, we use it to search for similar feedback once we've seen a lot of it.
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# Rows where ChatGPT couldn't be reached (even after retrying) get this label instead of a real answer.
+# This way they aren't mistaken for "none", and you can find them and re-run just those rows.
+ERROR_LABEL = "__ERROR__"
+
+# Below this many cached texts, plain numpy is fast enough to compare a new text against all of them.
+# Above it (and if faiss is installed), we switch to a faiss index that only checks the most promising ones.
+FAISS_MIN_VECTORS = 50_000
+
+def create_client(env_path):
+    """
+    Loads the API key from a specified .env file (env_path) and sets up a connection to OpenAI's API.
+    One connection pool is shared by every request in a run,
+    so we don't set up a new secure connection for each one, and HTTP/2 lets many requests
+    share the same connection. Close it with `await client.close()` when you're done.
+    
+    Args:
+        env_path (str): Path to your .env file containing the OpenAI API key
+        
+    Returns:
+        AsyncOpenAI: The client
+    """
+    load_dotenv(env_path)
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),  # Get API key from environment variables (i.e., you need OPENAI_API_KEY in your .env file)
+        max_retries=6,  # If a request hits a rate limit, times out, or can't connect, wait a bit (longer each time) and try again
+        http_client=httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            http2=True
+        )
+    )
+
 # This class contains all the logic for analyzing feedback
 class SimpleFeedbackAnalyzer:
     # This is a special method that runs when you create a new analyzer. It's like setting up your workspace before you start working.
     # self refers to the specific instance of the analyzer you're creating. It's like saying "this particular analyzer"
     # The other methods (create_prompt and get_area_for_improvement) are tools or functions that belong to this analyzer
-    def __init__(self, env_path): 
+    def __init__(self, env_path, max_concurrent_requests=50, max_requests_per_minute=500, similarity_threshold=0.92, cluster_threshold=0.9, cache_path=None, min_text_length=15): 
         # This is information for future people who use the analyzer.
         """
         Sets up the feedback analyzer by:
-        1. Loading the OpenAI API key
-        2. Setting up the connection to OpenAI
-        3. Defining the possible teaching skills to look for
+        1. Remembering where the OpenAI API key is
+        2. Defining the possible teaching skills to look for
+        
+        Use it with "async with analyzer:", which connects to OpenAI at the start and closes the connection at the end.
         
         Args:
             env_path (str): Path to your .env file containing the OpenAI API key
+            max_concurrent_requests (int): How many requests can be waiting on ChatGPT at the same time
+            max_requests_per_minute (int): The most requests to send to OpenAI per minute (check your OpenAI rate limits)
+            similarity_threshold (float): How similar (0 to 1) two feedback texts must be to reuse an earlier answer
+            cluster_threshold (float): How similar (0 to 1) two feedback texts in the same file must be to share one answer
+            cache_path (str): Optional path of a file used to save answers between runs
+            min_text_length (int): Feedback shorter than this many characters is marked "none" without asking ChatGPT
         """
-        # Load the API key from a specified .env file (env_path)
-        load_dotenv(env_path)
-        
-        # Set up the connection to OpenAI's API
-        self.client = OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY")  # Get API key from environment variables (i.e., you need OPENAI_API_KEY in your .env file)
-        )
+        # The API key is loaded from the .env file (env_path) when we connect to OpenAI in __aenter__ below.
+        # The connection belongs to the event loop that uses it, so it's only open inside "async with analyzer:".
+        self.env_path = env_path
+        self.client = None
         
         # List of teaching skills that ChatGPT will look for in the feedback
         # You can modify this list to look for different skills or change what you're looking for in the text
@@ -56,124 +115,1021 @@ class SimpleFeedbackAnalyzer:
             "Communication"
         ]
 
+        # Blank cells, very short text, and placeholders like "N/A" or "-" don't contain any feedback,
+        # so we mark them "none" ourselves instead of paying for a request
+        self.min_text_length = min_text_length
+        self._null_re = re.compile(r'^\s*(n/?a|none|—|-)?\s*$', re.I)
+
+        # Every answer ChatGPT is allowed to give
+        self.valid_labels = self.teaching_skills + ["other", "none", "multiple"]
+
+        # ChatGPT writes its answer one token (word piece) at a time, and most of the wait is spent writing.
+        # logit_bias strongly favors the tokens that make up our labels, so ChatGPT can only spell out a label,
+        # and max_tokens stops it as soon as the longest label could be finished.
+        encoding = tiktoken.encoding_for_model("gpt-4o-mini")
+        label_tokens = [encoding.encode(label) for label in self.valid_labels]
+        self._bias = {str(token): 100 for tokens in label_tokens for token in tokens}
+        self._max_tokens = max(len(tokens) for tokens in label_tokens)
+
+        # The instructions are the same for every row, so we build them once here and send them as the system message.
+        # Only the feedback itself changes, and create_prompt just fills it into the {fb} placeholder.
+        # This is where you may need to beg a bit.
+        # OpenAI automatically gives a discount on a repeated start of a request once it's at least 1024 tokens long,
+        # so if you add more instructions or examples, add them here rather than to the feedback message.
+        self._skills_csv = ", ".join(self.teaching_skills)
+        self._system_prompt = """You are an expert at analyzing teacher feedback. Respond with only the area that needs improvement.
+
+Analyze the feedback given to a pre-service teacher and identify the main area that needs improvement.
+
+Respond with ONLY ONE of these options: """ + self._skills_csv + """, "other", "none", or "multiple".
+
+Rules:
+- Choose "multiple" if there are several equally emphasized areas for improvement
+- Choose "none" if no specific area for improvement is mentioned
+- Choose "other" if the area for improvement doesn't match any of the listed skills
+- Otherwise, choose the most prominent teaching skill that needs improvement"""
+        self._prompt_tmpl = """Feedback text:
+{fb}"""
+
+        # Most of the time spent on each row is just waiting for ChatGPT to answer, so we send many rows at once.
+        # 50-200 usually works well. If you see lots of rate limit (429) errors, lower this number.
+        self.max_concurrent_requests = max_concurrent_requests
+
+        # Space requests out evenly so we don't go over the requests-per-minute limit on our OpenAI account
+        self.max_requests_per_minute = max_requests_per_minute
+        self._next_request_time = 0.0
+        self._rate_lock = asyncio.Lock()
+
+        # Many datasets contain the exact same feedback more than once (template comments, copy/paste).
+        # Looking a text up in a dictionary is far quicker (and cheaper) than asking ChatGPT again.
+        # If cache_path is given, answers are also saved to disk so re-running the script reuses them.
+        # Delete that file if you change the prompt or the list of teaching skills.
+        self._exact = {}
+        self.cache_path = cache_path
+        self._shelf = shelve.open(cache_path) if cache_path else None
+
+        # Feedback often repeats itself ("the classroom was too loud", "students were off-task").
+        # We turn each text into an embedding (a list of numbers describing its meaning) and, if we've already
+        # asked ChatGPT about a very similar text, reuse that answer instead of asking again.
+        self.emb_model = "text-embedding-3-small"
+        self._emb_encoding = tiktoken.encoding_for_model(self.emb_model)  # For counting how long each text is in tokens
+        self.similarity_threshold = similarity_threshold
+        self.cluster_threshold = cluster_threshold
+        self.cache_vecs = np.zeros((1024, 1536), dtype=np.float32)  # One row per text we've already asked about (grown as needed)
+        self.cache_labels = []                                      # The answer ChatGPT gave for each of those rows
+        self._index = None                                          # The faiss index, once the cache is big enough
+
     # Now we're defining a prompt to use for each row of text. 
     # Note that it requires a string of text (e.g., the feedback) 
     # Also note that it returns a string with the feedback surrounded by the prmopt
     def create_prompt(self, feedback_text):
         """
-        Creates the instruction text (prompt) that will be sent to ChatGPT.
+        Creates the message with the feedback that will be sent to ChatGPT (the instructions are in the system message).
         
         Args:
             feedback_text (str): The feedback text to analyze
             
         Returns:
-            str: The complete prompt for ChatGPT
+            str: The feedback message for ChatGPT
+        """
+        # Fill the feedback into the prompt we built in __init__
+        return self._prompt_tmpl.format(fb=feedback_text)
+
+    def create_request_body(self, feedback_text):
         """
-        # Convert the list of skills into a comma-separated string
-        skills_list = ", ".join(self.teaching_skills)
+        Creates everything ChatGPT needs for one feedback text (the model, the messages, and the settings).
+        This is shared by the regular requests and the Batch API so both ask ChatGPT the exact same thing.
         
-        # Create the prompt that tells ChatGPT exactly what to do. This is where you may need to beg a bit.
-        return f"""Analyze this feedback given to a pre-service teacher and identify the main area that needs improvement.
+        Args:
+            feedback_text (str): The feedback text to analyze
+            
+        Returns:
+            dict: The request to send to ChatGPT
+        """
+        return {
+            "model": "gpt-4o-mini",  # The GPT model to use
+            "messages": [
+                # Tell ChatGPT its role and the task. This is exactly the same for every row.
+                {
+                    "role": "system",
+                    "content": self._system_prompt
+                },
+                # Provide the feedback
+                {
+                    "role": "user",
+                    "content": self.create_prompt(feedback_text)
+                }
+            ],
+            "logit_bias": self._bias,  # Only let ChatGPT write the pieces of our labels
+            "max_tokens": self._max_tokens,  # Stop once the longest label is written
+            "temperature": 0,  # Lower temperature means more consistent responses. At 0 you should get (nearly) the same responses every time, which also makes the saved answers safe to reuse.
+            "seed": 42  # Asks OpenAI to make its choices the same way on every run, for even more repeatable results
+        }
+
+    def clean_response(self, content):
+        """
+        Tidies up ChatGPT's answer. Answers that aren't one of our expected values
+        are replaced with "other" for all rows at once by validate_labels.
         
-Feedback text:
-{feedback_text}
+        Args:
+            content (str): The text ChatGPT sent back
+            
+        Returns:
+            str: The identified area for improvement
+        """
+        area = content.strip()
 
-Respond with ONLY ONE of these options: {skills_list}, "other", "none", or "multiple".
+        # Because of max_tokens, ChatGPT may keep going after a short label (e.g., "none Student"),
+        # so keep the longest label the answer starts with
+        matches = [label for label in self.valid_labels if area.startswith(label)]
+        if matches:
+            return max(matches, key=len)
+        return area
 
-Rules:
-- Choose "multiple" if there are several equally emphasized areas for improvement
-- Choose "none" if no specific area for improvement is mentioned
-- Choose "other" if the area for improvement doesn't match any of the listed skills
-- Otherwise, choose the most prominent teaching skill that needs improvement"""
+    def is_blank(self, feedback_text):
+        """
+        Checks whether the feedback text is empty, too short, or a placeholder, so it can skip ChatGPT.
+        
+        Args:
+            feedback_text (str): The feedback text to check
+            
+        Returns:
+            bool: True if there's no feedback worth analyzing
+        """
+        # Placeholders are checked first. With the default min_text_length they're all short enough to be caught
+        # by the length check anyway, so this only makes a difference if you lower min_text_length.
+        return (
+            not isinstance(feedback_text, str)
+            or self._null_re.match(feedback_text) is not None
+            or len(feedback_text.strip()) < self.min_text_length
+        )
+
+    def _cache_key(self, feedback_text):
+        # Ignore capitalization and extra spaces at the start or end when matching texts
+        return feedback_text.strip().lower()
+
+    def lookup_exact(self, feedback_text):
+        """
+        Looks for an earlier answer for exactly the same feedback text.
+        
+        Args:
+            feedback_text (str): The feedback text to look up
+            
+        Returns:
+            str or None: The earlier answer, or None if we haven't seen this text before
+        """
+        key = self._cache_key(feedback_text)
+        if key in self._exact:
+            return self._exact[key]
+
+        # Check answers saved by earlier runs of the script
+        if self._shelf is not None:
+            area = self._shelf.get(hashlib.blake2b(key.encode()).hexdigest())
+            if area is not None:
+                self._exact[key] = area
+            return area
+        return None
+
+    def save_exact(self, feedback_text, area):
+        """
+        Remembers ChatGPT's answer for exactly this feedback text (and saves it to disk if cache_path was given).
+        
+        Args:
+            feedback_text (str): The feedback text
+            area (str): ChatGPT's answer for that text
+        """
+        key = self._cache_key(feedback_text)
+        self._exact[key] = area
+        if self._shelf is not None:
+            self._shelf[hashlib.blake2b(key.encode()).hexdigest()] = area
+
+    def close(self):
+        """
+        Finishes saving the answer cache to disk. Call this when you're done with the analyzer.
+        """
+        if self._shelf is not None:
+            self._shelf.close()
+            self._shelf = None
+
+    # "async with analyzer:" runs __aenter__ at the start of the block and __aexit__ at the end (even if something goes wrong)
+    async def __aenter__(self):
+        # Re-open the answer cache if an earlier "async with" block closed it
+        if self.cache_path and self._shelf is None:
+            self._shelf = shelve.open(self.cache_path)
+        self.client = create_client(self.env_path)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+        await self.client.close()
+        self.client = None
+
+    async def embed_all(self, texts, batch_size=2048, max_batch_tokens=250_000):
+        """
+        Turns many feedback texts into embeddings with length 1, so comparing two texts is a simple multiplication.
+        OpenAI accepts up to 2048 texts (and 300,000 tokens) per request, so this needs far fewer requests
+        than embedding one text at a time.
+        
+        Args:
+            texts (list): The feedback texts to embed
+            batch_size (int): The most texts to send in each request
+            max_batch_tokens (int): The most tokens to send in each request (a little under OpenAI's limit)
+            
+        Returns:
+            numpy.ndarray: The normalized embeddings, one row per text
+        """
+        vectors = [np.zeros((0, self.cache_vecs.shape[1]), dtype=np.float32)]
+        batch, batch_tokens = [], 0
+        for feedback_text in texts:
+            # The embedding model only reads the first 8191 tokens of a text, so cut longer texts short
+            tokens = self._emb_encoding.encode(feedback_text)
+            if len(tokens) > 8191:
+                tokens = tokens[:8191]
+                feedback_text = self._emb_encoding.decode(tokens)
+
+            # Send the current batch once adding this text would make it too big
+            if batch and (len(batch) == batch_size or batch_tokens + len(tokens) > max_batch_tokens):
+                vectors.append(await self._embed_batch(batch))
+                batch, batch_tokens = [], 0
+            batch.append(feedback_text)
+            batch_tokens += len(tokens)
+        if batch:
+            vectors.append(await self._embed_batch(batch))
 
-    def get_area_for_improvement(self, feedback_text):
+        vectors = np.concatenate(vectors)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+    async def _embed_batch(self, batch):
+        # Embedding requests count towards our rate limit too
+        await self.wait_for_rate_limit()
+        response = await self.client.embeddings.create(input=batch, model=self.emb_model)
+        return np.array([d.embedding for d in response.data], dtype=np.float32)
+
+    def cluster_vectors(self, vectors, block_size=1024):
+        """
+        Groups feedback texts that say nearly the same thing, so ChatGPT only needs to see one text from each group.
+        Two texts are linked if their similarity is above cluster_threshold, and a group is every text you can reach
+        by following links. Each group is represented by its medoid: the text most similar to the rest of its group.
+        Because links can chain (A is like B, B is like C, but A isn't much like C), any text that isn't at least
+        similarity_threshold similar to its medoid is split off into a group of its own.
+        
+        Args:
+            vectors (numpy.ndarray): The normalized embeddings, one row per text
+            block_size (int): How many rows to compare at a time (keeps memory use down)
+            
+        Returns:
+            tuple: The group number of every text, and the position of each group's medoid (in group order)
+        """
+        n = len(vectors)
+        if n == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+        # Compare a block of texts against all texts at a time and only keep the pairs that are similar enough
+        rows, cols, sims = [], [], []
+        for start in range(0, n, block_size):
+            block = vectors[start:start + block_size] @ vectors.T
+            r, c = np.nonzero(block > self.cluster_threshold)
+            rows.append(r + start)
+            cols.append(c)
+            sims.append(block[r, c])
+        adjacency = csr_matrix((np.concatenate(sims), (np.concatenate(rows), np.concatenate(cols))), shape=(n, n))
+        _, cluster_ids = connected_components(adjacency, directed=False)
+
+        # Links only exist inside a group, so a row's total similarity is its similarity to the rest of its group.
+        # Sort by group and then by total similarity (highest first); the first text of each group is its medoid.
+        scores = np.asarray(adjacency.sum(axis=1)).ravel()
+        order = np.lexsort((-scores, cluster_ids))
+        sorted_ids = cluster_ids[order]
+        is_first = np.r_[True, sorted_ids[1:] != sorted_ids[:-1]]
+        medoids = order[is_first]
+
+        # Only share the medoid's answer with texts that are as similar to it as we'd require from the cache
+        to_medoid = np.einsum("ij,ij->i", vectors, vectors[medoids[cluster_ids]])
+        loners = np.flatnonzero(to_medoid < self.similarity_threshold)
+        cluster_ids[loners] = len(medoids) + np.arange(len(loners))
+        return cluster_ids, np.concatenate([medoids, loners])
+
+    async def embed_text(self, feedback_text):
+        """
+        Turns one feedback text into a normalized embedding.
+        
+        Args:
+            feedback_text (str): The feedback text to embed
+            
+        Returns:
+            numpy.ndarray: The normalized embedding
+        """
+        return (await self.embed_all([feedback_text]))[0]
+
+    def lookup_similar(self, vector):
+        """
+        Looks for an earlier feedback text that is similar enough to reuse its answer.
+        
+        Args:
+            vector (numpy.ndarray): The normalized embedding of the new feedback text
+            
+        Returns:
+            str or None: The earlier answer, or None if nothing is similar enough
+        """
+        if not self.cache_labels:
+            return None
+
+        if self._index is not None:
+            # Ask faiss for the single most similar cached text
+            sims, ids = self._index.search(vector.reshape(1, -1), 1)
+            best, best_sim = ids[0, 0], sims[0, 0]
+        else:
+            # Cosine similarity with every cached text at once (1 means identical meaning)
+            sims = self.cache_vecs[:len(self.cache_labels)] @ vector
+            best = sims.argmax()
+            best_sim = sims[best]
+
+        if best >= 0 and best_sim > self.similarity_threshold:
+            return self.cache_labels[best]
+        return None
+
+    def add_to_cache(self, vector, area):
+        """
+        Remembers ChatGPT's answer for a feedback text so similar texts can reuse it.
+        
+        Args:
+            vector (numpy.ndarray): The normalized embedding of the feedback text
+            area (str): ChatGPT's answer for that text
+        """
+        n = len(self.cache_labels)
+
+        # Double the space when we run out, rather than copying the whole cache for every new text
+        if n == len(self.cache_vecs):
+            self.cache_vecs = np.concatenate([self.cache_vecs, np.zeros_like(self.cache_vecs)])
+        self.cache_vecs[n] = vector
+        self.cache_labels.append(area)
+
+        # Once the cache is large, build a faiss HNSW index (a graph that quickly finds close neighbors) and keep it up to date
+        if faiss is not None and n + 1 >= FAISS_MIN_VECTORS:
+            if self._index is None:
+                self._index = faiss.IndexHNSWFlat(self.cache_vecs.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+                self._index.add(self.cache_vecs[:n + 1])
+            else:
+                self._index.add(vector.reshape(1, -1))
+
+    async def wait_for_rate_limit(self):
+        """
+        Waits until it's our turn to send a request, so we send at most max_requests_per_minute each minute.
+        """
+        async with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_time - now
+            self._next_request_time = max(now, self._next_request_time) + 60 / self.max_requests_per_minute
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def validate_labels(self, results):
+        """
+        Makes sure every answer is one of our expected values, checking all rows in one step.
+        Anything else is replaced with "other".
+        
+        Args:
+            results (list): The answers for every row
+            
+        Returns:
+            numpy.ndarray: The checked answers, in the same order
+        """
+        raw = np.array(results, dtype=object)
+        valid = np.array(self.valid_labels + [ERROR_LABEL], dtype=object)
+        raw[~np.isin(raw, valid)] = "other"
+        return raw
+
+    # "async def" means this function can pause while it waits for ChatGPT, letting other rows be sent in the meantime
+    async def get_area_for_improvement(self, feedback_text, vector=None):
         """
         Sends the feedback text to ChatGPT and gets back the area for improvement.
         
         Args:
             feedback_text (str): The feedback text to analyze
+            vector (numpy.ndarray): The text's normalized embedding, if it was already made by embed_all
             
         Returns:
             str: The identified area for improvement
         """
-        # Skip empty text to avoid errors
-        if not feedback_text or len(feedback_text.strip()) < 0:
+        # Skip empty, very short, or placeholder text without asking ChatGPT
+        if self.is_blank(feedback_text):
             return "none"
 
+        # Reuse an earlier answer if we've already seen exactly this text
+        area = self.lookup_exact(feedback_text)
+        if area is not None:
+            return area
+
+        # Reuse an earlier answer if we've already seen a very similar text.
+        # This only saves requests, so if the embedding fails we just ask ChatGPT instead.
+        try:
+            if vector is None:
+                vector = await self.embed_text(feedback_text)
+            area = self.lookup_similar(vector)
+            if area is not None:
+                return area
+        except Exception as e:
+            print(f"Error embedding feedback, asking ChatGPT directly: {e}")
+            vector = None
+
         try:
             # Send the request to ChatGPT
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",  # The GPT model to use
-                messages=[
-                    # Tell ChatGPT its role
-                    {
-                        "role": "system",
-                        "content": "You are an expert at analyzing teacher feedback. Respond with only the area that needs improvement."
-                    },
-                    # Provide the actual task and feedback
-                    {
-                        "role": "user",
-                        "content": self.create_prompt(feedback_text)
-                    }
-                ],
-                temperature=1  # Lower temperature means more consistent responses. If temperature is 0 you should get the same responses every time, but ChatGPT may be more risk-averse.
-            )
-
-            # Extract the response text from ChatGPT
-            area = response.choices[0].message.content.strip()
-
-            # Make sure the response is one of our expected values
-            if area not in self.teaching_skills + ["other", "none", "multiple"]:
-                area = "other"
+            await self.wait_for_rate_limit()
+            response = await self.client.chat.completions.create(**self.create_request_body(feedback_text))
 
+            # Extract the response text from ChatGPT and remember it for similar texts
+            area = self.clean_response(response.choices[0].message.content)
+            self.save_exact(feedback_text, area)
+            if vector is not None:
+                self.add_to_cache(vector, area)
             return area
 
         except Exception as e:
-            # If anything goes wrong, print the error and return "none"
+            # If anything still goes wrong after retrying, print the error and mark the row so it can be re-run
             print(f"Error analyzing feedback: {e}")
-            return "none"
+            return ERROR_LABEL
+
+    async def group_texts(self, texts):
+        """
+        Finds which feedback texts still need ChatGPT and groups the ones that say nearly the same thing.
+        
+        Args:
+            texts (list): The feedback texts to analyze
+            
+        Returns:
+            tuple: The answers known so far (None for rows that need ChatGPT), the positions of the rows that need ChatGPT,
+                their embeddings, the group number of each of those rows, and the position of each group's medoid
+        """
+        # Blank text and text we've already seen exactly don't need ChatGPT.
+        # Everything else is None for now and gets filled in below.
+        known = ["none" if self.is_blank(feedback_text) else self.lookup_exact(feedback_text) for feedback_text in texts]
+        results = np.array(known, dtype=object)
+        to_label = np.array([i for i, area in enumerate(known) if area is None], dtype=int)
+
+        # Embed the remaining texts in a few large requests, then group the ones that say nearly the same thing
+        try:
+            vectors = await self.embed_all([texts[i] for i in to_label])
+            cluster_ids, medoids = self.cluster_vectors(vectors)
+        except Exception as e:
+            # Treat every text as its own group; get_area_for_improvement will embed each text by itself instead
+            print(f"Error embedding feedback, falling back to one text at a time: {e}")
+            vectors = [None] * len(to_label)
+            cluster_ids = medoids = np.arange(len(to_label))
+        print(f"Sending {len(medoids)} groups of similar feedback (out of {len(to_label)} new rows) to ChatGPT")
+
+        return results, to_label, vectors, cluster_ids, medoids
+
+    async def analyze_texts(self, texts, on_result=None):
+        """
+        Gets the area for improvement for many feedback texts at once.
+        Similar texts are grouped first, and only one text from each group is sent to ChatGPT.
+        
+        Args:
+            texts (list): The feedback texts to analyze
+            on_result (function): Optional function called as on_result(positions, area) each time a group
+                of rows gets its answer from ChatGPT (positions are the rows' places in texts)
+            
+        Returns:
+            numpy.ndarray: The identified areas for improvement, in the same order as texts
+        """
+        results, to_label, vectors, cluster_ids, medoids = await self.group_texts(texts)
+
+        # The semaphore only lets max_concurrent_requests rows talk to ChatGPT at the same time
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        completed = 0
+
+        # The rows in each group, so we can report a group's answer for all of its rows as soon as it arrives
+        members = np.split(np.argsort(cluster_ids, kind="stable"), np.cumsum(np.bincount(cluster_ids))[:-1])
+
+        async def bounded(group, medoid):
+            nonlocal completed
+            async with semaphore:
+                area = await self.get_area_for_improvement(texts[to_label[medoid]], vectors[medoid])
+            if on_result is not None:
+                on_result(to_label[members[group]], area)
+
+            # Show progress update every 10 groups. This is nice if you're running a lot of code.
+            completed += 1
+            if completed % 10 == 0:
+                print(f"Processed {completed} of {len(medoids)} groups")
+            return area
+
+        # gather runs all of the groups together and returns the answers in the original order
+        medoid_labels = await asyncio.gather(*[bounded(group, medoid) for group, medoid in enumerate(medoids)])
+
+        # Every row gets the answer given for its group
+        results[to_label] = np.array(medoid_labels, dtype=object)[cluster_ids]
+        return results
+
+    async def start_grouped_batch(self, texts):
+        """
+        Groups the feedback texts like analyze_texts does and starts a Batch API job for one text from each group.
+        Use finish_grouped_batch to wait for the answers. Starting several batches before waiting on any of them
+        lets OpenAI work on all of them at the same time.
+        
+        Args:
+            texts (list): The feedback texts to analyze
+            
+        Returns:
+            tuple: Everything finish_grouped_batch needs to put the answers back in place
+        """
+        results, to_label, _, cluster_ids, medoids = await self.group_texts(texts)
+        batch_id = await self.start_batch([texts[i] for i in to_label[medoids]])
+        return results, to_label, cluster_ids, medoids, batch_id
+
+    async def finish_grouped_batch(self, plan, texts, poll_interval=60):
+        """
+        Waits for a batch started by start_grouped_batch and gives every row its group's answer.
+        
+        Args:
+            plan (tuple): What start_grouped_batch returned
+            texts (list): The same feedback texts that were passed to start_grouped_batch
+            poll_interval (int): How many seconds to wait between checks on the batch
+            
+        Returns:
+            numpy.ndarray: The identified areas for improvement, in the same order as texts
+        """
+        results, to_label, cluster_ids, medoids, batch_id = plan
+        medoid_labels = await self.collect_batch(batch_id, [texts[i] for i in to_label[medoids]], poll_interval)
+        results[to_label] = np.array(medoid_labels, dtype=object)[cluster_ids]
+        return results
+
+    async def submit_batch(self, texts, poll_interval=60):
+        """
+        Gets the area for improvement for many feedback texts using OpenAI's Batch API.
+        The Batch API costs half as much as regular requests and has its own (higher) rate limits,
+        but the results can take up to 24 hours to come back.
+        
+        Args:
+            texts (list): The feedback texts to analyze
+            poll_interval (int): How many seconds to wait between checks on the batch
+            
+        Returns:
+            list: The identified areas for improvement, in the same order as texts
+        """
+        return await self.collect_batch(await self.start_batch(texts), texts, poll_interval)
+
+    async def start_batch(self, texts):
+        """
+        Uploads the feedback texts and starts a Batch API job for them, without waiting for it to finish.
+        
+        Args:
+            texts (list): The feedback texts to analyze
+            
+        Returns:
+            str or None: The batch's id, or None if there was nothing to send
+        """
+        # Write one request per line. custom_id is the row number so we can match the answers back up later.
+        n_requests = 0
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False, encoding="utf-8") as batch_file:
+            for row_number, feedback_text in enumerate(texts):
+                # Skip empty, very short, or placeholder text; those rows get "none" below
+                if self.is_blank(feedback_text):
+                    continue
+                request = {
+                    "custom_id": str(row_number),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": self.create_request_body(feedback_text)
+                }
+                batch_file.write(json.dumps(request) + "\n")
+                n_requests += 1
+
+        # OpenAI won't accept an empty batch
+        if n_requests == 0:
+            os.remove(batch_file.name)
+            return None
+
+        # Upload the file and start the batch
+        try:
+            with open(batch_file.name, "rb") as f:
+                uploaded = await self.client.files.create(file=f, purpose="batch")
+        finally:
+            os.remove(batch_file.name)
+        batch = await self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        print(f"Submitted batch {batch.id} with {n_requests} requests")
+        return batch.id
+
+    async def collect_batch(self, batch_id, texts, poll_interval=60):
+        """
+        Waits for a batch started by start_batch to finish and downloads its answers.
+        
+        Args:
+            batch_id (str or None): What start_batch returned
+            texts (list): The same feedback texts that were passed to start_batch
+            poll_interval (int): How many seconds to wait between checks on the batch
+            
+        Returns:
+            list: The identified areas for improvement, in the same order as texts
+        """
+        # Every row we sent starts out marked as an error and only gets a real answer if ChatGPT sent one back,
+        # so a request that's missing from the results can't be mistaken for "none"
+        results = ["none" if self.is_blank(feedback_text) else ERROR_LABEL for feedback_text in texts]
+        if batch_id is None:
+            return results
+
+        print(f"Waiting for batch {batch_id} to finish...")
+        batch = await self.client.batches.retrieve(batch_id)
+
+        # Check on the batch every poll_interval seconds until OpenAI is done with it
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+            print(f"Batch status: {batch.status}")
+
+        if batch.status != "completed":
+            raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+
+        # Download the answers and put them back in the same order as texts
+        if batch.output_file_id:
+            output = await self.client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                answer = json.loads(line)
+                response = answer.get("response")
+                if not response or response["status_code"] != 200:
+                    print(f"Error analyzing feedback in row {answer['custom_id']}: {answer.get('error')}")
+                    continue
+                row_number = int(answer["custom_id"])
+                results[row_number] = self.clean_response(response["body"]["choices"][0]["message"]["content"])
+                self.save_exact(texts[row_number], results[row_number])
+
+        # Requests that failed completely are listed in a separate error file
+        if batch.error_file_id:
+            errors = await self.client.files.content(batch.error_file_id)
+            for line in errors.text.splitlines():
+                if line.strip():
+                    answer = json.loads(line)
+                    print(f"Error analyzing feedback in row {answer['custom_id']}: {answer.get('error')}")
+
+        return results
+
+# This class saves our progress so a long run that gets interrupted doesn't have to start over (and pay again)
+class Checkpoint:
+    """
+    Keeps the answers we've gotten so far in a Parquet file. If the script stops part way through
+    (you press stop, your internet drops, ...), re-running it skips every row that already has an answer.
+    Rows are matched by a hash (a number computed from the text), so the same text always gets the same answer.
+    The file is deleted once a run finishes with every row analyzed. If you change the prompt or the list of
+    teaching skills after an interrupted run, delete the checkpoint file yourself.
+    """
+    def __init__(self, path, save_every=500):
+        """
+        Args:
+            path (str): Path of the checkpoint file
+            save_every (int): Save to disk after this many new answers
+        """
+        self.path = path
+        self.save_every = save_every
+        self._unsaved = 0
+
+        # Load the answers from an earlier run, if there was one
+        if os.path.exists(path):
+            cp = pd.read_parquet(path)
+            self.labels = dict(zip(cp['row_hash'].tolist(), cp['area_for_improvement'].tolist()))
+            print(f"Loaded {len(self.labels)} answers from checkpoint {path}")
+        else:
+            self.labels = {}
+
+    def lookup(self, hashes):
+        """
+        Returns the saved answer for each row hash, or None for rows without one.
+        """
+        return np.array([self.labels.get(h) for h in hashes.tolist()], dtype=object)
+
+    def add(self, hashes, areas):
+        """
+        Records answers for some rows and saves to disk every save_every answers.
+        Rows marked ERROR_LABEL are left out so they're tried again next time.
+        
+        Args:
+            hashes (numpy.ndarray): The rows' hashes
+            areas (str or numpy.ndarray): One answer for all of the rows, or one answer per row
+        """
+        areas = np.broadcast_to(np.asarray(areas, dtype=object), hashes.shape)
+        keep = areas != ERROR_LABEL
+        self.labels.update(zip(hashes[keep].tolist(), areas[keep].tolist()))
+        self._unsaved += int(keep.sum())
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        """
+        Writes all answers to disk. We write to a temporary file first and then swap it in,
+        so stopping the script mid-save can't leave a broken checkpoint behind.
+        """
+        cp = pd.DataFrame({
+            'row_hash': np.array(list(self.labels.keys()), dtype=np.uint64),
+            'area_for_improvement': list(self.labels.values())
+        })
+        cp.to_parquet(self.path + ".tmp", index=False)
+        os.replace(self.path + ".tmp", self.path)
+        self._unsaved = 0
+
+    def delete(self):
+        """
+        Removes the checkpoint file once it's no longer needed.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.labels = {}
+        self._unsaved = 0
+
+def column_dtypes(rows, columns):
+    """
+    Picks one type for each column by looking at every value in it, so every chunk gets the same types
+    (e.g., a column that's empty in the first chunk but filled in further down).
+    
+    Args:
+        rows (iterable): The rows of the sheet, without the column names
+        columns (tuple): The column names
+        
+    Returns:
+        dict: The pandas type to use for each column
+    """
+    seen = [set() for _ in columns]
+    for row in rows:
+        for types, value in zip(seen, row):
+            if value is not None:
+                types.add(type(value))
+
+    dtypes = {}
+    for column, types in zip(columns, seen):
+        if types and types <= {bool}:
+            dtypes[column] = "boolean"
+        elif types and types <= {int}:
+            dtypes[column] = "Int64"
+        elif types and types <= {int, float}:
+            dtypes[column] = "Float64"
+        elif types and types <= {datetime.datetime}:
+            dtypes[column] = "datetime64[ns]"
+        else:
+            # Text, empty columns, and columns that mix different kinds of values are stored as text
+            dtypes[column] = "string[pyarrow]"
+    dtypes['text'] = 'string[pyarrow]'
+    return dtypes
+
+# This function reads the Excel file in pieces ("chunks") so very large files don't use up all of your computer's memory
+def read_excel_chunks(input_file, chunksize=10_000):
+    """
+    Reads an Excel file a chunk of rows at a time.
+    
+    Args:
+        input_file (str): Path to your input Excel file
+        chunksize (int): How many rows to read at a time
+        
+    Yields:
+        pandas.DataFrame: The next chunk of rows
+    """
+    # read_only mode reads the rows one by one instead of loading the whole workbook at once
+    workbook = load_workbook(input_file, read_only=True)
+    try:
+        # Use the first sheet (like pd.read_excel does), not whichever sheet was open when the file was saved
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        columns = next(rows)  # The first row has the column names
+        
+        # Read through the sheet once to pick each column's type, then start again from the top to read the chunks
+        dtypes = column_dtypes(rows, columns)
+        rows = sheet.iter_rows(min_row=2, values_only=True)
+        chunk = []
+        n_chunks = 0
+        for row in rows:
+            # Skip completely empty rows (Excel often has a few at the bottom)
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            if len(chunk) == chunksize:
+                yield pd.DataFrame.from_records(chunk, columns=columns).astype(dtypes)
+                n_chunks += 1
+                chunk = []
+        # If the sheet only has column names, still send one empty chunk so the output file gets made with the right columns
+        if chunk or n_chunks == 0:
+            yield pd.DataFrame.from_records(chunk, columns=columns).astype(dtypes)
+    finally:
+        workbook.close()
+
+# These two classes save the results one chunk at a time. Both have the same write, close, and discard methods,
+# so process_chunks doesn't need to know which kind of file it's saving.
+# They write to a ".partial" file first and only rename it to output_file once every chunk has been written,
+# so a run that fails part way through can't leave behind a file that looks complete but isn't.
+class ParquetChunkWriter:
+    """
+    Saves results to a Parquet file. Parquet is much faster to write and much smaller than Excel,
+    and keeps each column's type. You can open it with pd.read_parquet(output_file).
+    """
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self._partial_file = output_file + ".partial"
+        self._writer = None
+
+    def write(self, df):
+        # Every chunk must have the same columns and types as the first one
+        schema = self._writer.schema if self._writer is not None else None
+        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._partial_file, table.schema, compression="snappy")
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self._partial_file, self.output_file)
+
+    def discard(self):
+        if self._writer is not None:
+            self._writer.close()
+            os.remove(self._partial_file)
+
+class ExcelChunkWriter:
+    """
+    Saves results to an Excel file.
+    """
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self._partial_file = output_file + ".partial"
+        # constant_memory mode writes each row to disk right away instead of keeping the whole sheet in memory
+        self._workbook = xlsxwriter.Workbook(self._partial_file, {"constant_memory": True, "default_date_format": "yyyy-mm-dd"})
+        self._worksheet = self._workbook.add_worksheet()
+        self._n_rows = 0
+
+    def write(self, df):
+        # Write the column names once, then this chunk's rows below them (empty cells are written as blanks)
+        if self._n_rows == 0:
+            self._worksheet.write_row(0, 0, df.columns)
+        for offset, row in enumerate(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)):
+            self._worksheet.write_row(self._n_rows + 1 + offset, 0, row)
+        self._n_rows += len(df)
+
+    def close(self):
+        self._workbook.close()
+        os.replace(self._partial_file, self.output_file)
+
+    def discard(self):
+        self._workbook.close()
+        os.remove(self._partial_file)
+
+def prepare_chunk(df, checkpoint):
+    """
+    Gets a chunk's feedback texts and looks them up in the checkpoint.
+    
+    Args:
+        df (pandas.DataFrame): The chunk of rows
+        checkpoint (Checkpoint): Where answers from earlier runs are saved
+        
+    Returns:
+        tuple: The texts, their hashes, the answers found in the checkpoint (None for the rest),
+            and the positions of the rows that still need an answer
+    """
+    # Get the feedback text from each row (note the importance of the text variable being present in the data)
+    # to_numpy grabs the whole column at once instead of building a new row object for every row
+    texts = df['text'].to_numpy(dtype=object, na_value=None)
+    
+    # Skip rows that already have an answer from an earlier (interrupted) run
+    hashes = pd.util.hash_pandas_object(df['text'], index=False).to_numpy()
+    results = checkpoint.lookup(hashes)
+    todo = np.flatnonzero(pd.isna(results))
+    if len(todo) < len(df):
+        print(f"Found {len(df) - len(todo)} rows in the checkpoint")
+    return texts, hashes, results, todo
+
+async def process_chunks(analyzer, input_file, writer, checkpoint, use_batch=False, chunksize=10_000):
+    """
+    Analyzes the Excel file one chunk at a time, writing each chunk's results before reading the next one.
+    
+    Args:
+        analyzer (SimpleFeedbackAnalyzer): The analyzer to use
+        input_file (str): Path to your input Excel file
+        writer (ParquetChunkWriter or ExcelChunkWriter): Where to save the results
+        checkpoint (Checkpoint): Where to save (and look up) answers as they come in
+        use_batch (bool): Use OpenAI's Batch API (half the cost, but can take up to 24 hours)
+        chunksize (int): How many rows to read and analyze at a time
+        
+    Returns:
+        int: The number of rows that could not be analyzed
+    """
+    n_rows = 0
+    n_errors = 0
+    finished = False
+    # Connect to OpenAI for this run; the connection and the answer cache are closed when the "async with" block ends
+    async with analyzer:
+        try:
+            # With the Batch API, first start a batch for every chunk so OpenAI works on all of them at the same time.
+            # Below, we read the file again and wait for each chunk's batch in turn.
+            batches = []
+            if use_batch:
+                for df in read_excel_chunks(input_file, chunksize):
+                    print(f"Preparing a batch for rows {n_rows + 1} to {n_rows + len(df)}...")
+                    texts, _, results, todo = prepare_chunk(df, checkpoint)
+                    plan = await analyzer.start_grouped_batch(texts[todo]) if len(todo) else None
+                    batches.append((results, todo, plan))
+                    n_rows += len(df)
+                n_rows = 0
+            
+            for chunk_number, df in enumerate(read_excel_chunks(input_file, chunksize)):
+                print(f"Analyzing rows {n_rows + 1} to {n_rows + len(df)}...")
+                
+                if use_batch:
+                    # Use what we found when the batch was started (the checkpoint may have changed since then)
+                    texts = df['text'].to_numpy(dtype=object, na_value=None)
+                    hashes = pd.util.hash_pandas_object(df['text'], index=False).to_numpy()
+                    results, todo, plan = batches[chunk_number]
+                    if plan is not None:
+                        results[todo] = await analyzer.finish_grouped_batch(plan, texts[todo])
+                        checkpoint.add(hashes[todo], results[todo])
+                else:
+                    texts, hashes, results, todo = prepare_chunk(df, checkpoint)
+                    
+                    # Save each group's answer to the checkpoint as soon as it arrives
+                    covered = np.zeros(len(todo), dtype=bool)
+                    def on_result(positions, area):
+                        covered[positions] = True
+                        checkpoint.add(hashes[todo[positions]], area)
+                    
+                    if len(todo):
+                        results[todo] = await analyzer.analyze_texts(texts[todo], on_result)
+                        
+                        # Blank rows and rows answered from the cache never went to ChatGPT, so save them here
+                        rest = todo[~covered]
+                        checkpoint.add(hashes[rest], results[rest])
+                
+                # Make sure every response is one of our expected values
+                results = analyzer.validate_labels(results)
+                n_errors += (results == ERROR_LABEL).sum()
+                
+                # Save the results in a new column of our DataFrame.
+                # A categorical column stores each answer once and then just a small number per row, which saves a lot of memory.
+                df['area_for_improvement'] = pd.Categorical(results, categories=analyzer.valid_labels + [ERROR_LABEL])
+                
+                writer.write(df)
+                n_rows += len(df)
+        except BaseException:
+            # Don't leave a half-written output file behind
+            writer.discard()
+            raise
+        else:
+            writer.close()
+            finished = n_errors == 0
+        finally:
+            if finished:
+                # Every row has an answer and the results are saved, so the checkpoint isn't needed anymore.
+                # Keeping it would make the next run reuse its answers even after you change the prompt.
+                checkpoint.delete()
+            else:
+                # Save our progress so a re-run can pick up where this one stopped, even if something went wrong or you pressed stop
+                checkpoint.save()
+    
+    return n_errors
 
 # Now we setup another function that will import our data from Excel and read our .env file
-def process_excel_file(input_file, output_file, env_path):
+def process_excel_file(input_file, output_file, env_path, use_batch=False, cache_path=None, chunksize=10_000, save_excel=False, checkpoint_path=None):
     """
     Main function that:
-    1. Reads the Excel file
+    1. Reads the Excel file, a chunk of rows at a time
     2. Processes each piece of feedback
-    3. Saves the results to a new Excel file
+    3. Saves the results to a new Parquet file (or Excel file if save_excel is True)
     
     Args:
         input_file (str): Path to your input Excel file
+        output_file (str): Path of the file to save results to (the extension is changed to .parquet unless save_excel is True)
         env_path (str): Path to your .env file with API key
+        use_batch (bool): Use OpenAI's Batch API (half the cost, but can take up to 24 hours)
+        cache_path (str): Optional path of a file used to save ChatGPT's answers between runs
+        chunksize (int): How many rows to read and analyze at a time
+        save_excel (bool): Save the results as an Excel file instead of a Parquet file
+        checkpoint_path (str): Where to save progress so an interrupted run can pick up where it left off
+            (defaults to the output file's name ending in " - checkpoint.parquet")
     """
     try:
-        # Load the Excel file into a pandas DataFrame
-        print(f"Reading data from {input_file}...")
-        df = pd.read_excel(input_file)
+        # Pick the kind of file to save the results to
+        if save_excel:
+            writer = ExcelChunkWriter(output_file)
+        else:
+            output_file = os.path.splitext(output_file)[0] + ".parquet"
+            writer = ParquetChunkWriter(output_file)
         
+        # Load (or start) the checkpoint that lets us resume an interrupted run
+        if checkpoint_path is None:
+            checkpoint_path = os.path.splitext(output_file)[0] + " - checkpoint.parquet"
+        checkpoint = Checkpoint(checkpoint_path)
+
         # Create an instance of our feedback analyzer (i.e., we can run the SimpleFeedbackAnalyzer defined above using the word "analyzer")
-        analyzer = SimpleFeedbackAnalyzer(env_path)
+        analyzer = SimpleFeedbackAnalyzer(env_path, cache_path=cache_path)
         
-        # Add a new column to store our results
-        df['area_for_improvement'] = 'none'
+        # Process every row in the Excel file, sending many rows to ChatGPT at the same time
+        print(f"Reading and analyzing feedback from {input_file}...")
+        n_errors = asyncio.run(process_chunks(analyzer, input_file, writer, checkpoint, use_batch, chunksize))
         
-        # Process each row in the Excel file
-        print("Analyzing feedback texts...")
-        for index, row in df.iterrows():
-            # Get the feedback text from the current row (note the importance of the text variable being present in the data)
-            feedback_text = row['text']
-            
-            # Get the area for improvement from ChatGPT
-            result = analyzer.get_area_for_improvement(feedback_text)
-            
-            # Save the result in our DataFrame. This is saved in our dataframe (df) at rownumber index and in column 'area_for_improvement'
-            df.at[index, 'area_for_improvement'] = result
-            
-            # Show progress update every 10 rows. This is nice if you're running a lot of code.
-            if (index + 1) % 10 == 0:
-                print(f"Processed {index + 1} of {len(df)} rows")
+        # Let the user know if some rows couldn't be analyzed
+        if n_errors:
+            print(f"{n_errors} rows could not be analyzed and are marked {ERROR_LABEL}. Re-run the script to retry them.")
         
-        # Save the results to a new Excel file
-        df.to_excel(output_file, index=False)
         print(f"\nAnalysis complete! Results saved to: {output_file}")
         
     except Exception as e:
@@ -187,10 +1143,19 @@ def main():
     # IMPORTANT: Update these paths to match your computer!
     env_path = r"C:\Users\Andre\Dropbox\ChatGPT Qual Example\scripts\.env"
     input_file = r"C:\Users\Andre\Dropbox\ChatGPT Qual Example\data\Example Data.xlsx"
-    output_file = r"C:\Users\Andre\Dropbox\ChatGPT Qual Example\output\Example Data - Coded.xlsx"
+    output_file = r"C:\Users\Andre\Dropbox\ChatGPT Qual Example\output\Example Data - Coded.parquet"
+    cache_path = r"C:\Users\Andre\Dropbox\ChatGPT Qual Example\output\answer_cache"
+    
+    # Set this to True to use OpenAI's Batch API. It's half the price, but you may have to wait up to 24 hours for results.
+    use_batch = False
+    
+    # Results are saved as a Parquet file (open it with pd.read_parquet). Set this to True to save an Excel file instead.
+    save_excel = False
+    if save_excel:
+        output_file = os.path.splitext(output_file)[0] + ".xlsx"
     
     # Start processing the Excel file
-    process_excel_file(input_file, output_file, env_path)
+    process_excel_file(input_file, output_file, env_path, use_batch, cache_path, save_excel=save_excel)
 
 # This is the standard way to run a Python script
 if __name__ == "__main__":